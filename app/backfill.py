@@ -0,0 +1,173 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
+from core.config import settings
+from core.scoring import refresh_activity_weights
+from core.challenges import attribute_activities, get_sync_window, get_user_challenges
+from db.supabase import supabase
+from db.models import UserTokens, to_naive_utc
+from db.queries import get_user_tokens
+from db.versions import bump_activity_data_version
+from app.sync import activity_to_row
+
+if TYPE_CHECKING:
+    from telegram import Bot
+
+logger = logging.getLogger(__name__)
+
+# telegram_id -> running backfill task
+_tasks: dict[int, asyncio.Task] = {}
+
+
+def is_backfilling(telegram_id: int) -> bool:
+    return telegram_id in _tasks
+
+
+async def start_backfill(user: UserTokens, bot: "Bot"):
+    """
+    Creates (or restarts) the backfill job of a newly connected user and runs it
+    in the background.
+    """
+    start_date, _ = get_sync_window(await get_user_challenges(user.telegram_id))
+    if start_date is None:
+        logger.info("No sync start date configured. Skipping backfill.")
+        return
+
+    # Runs inside the OAuth callback request, so keep the DB call off the event loop
+    await asyncio.to_thread(
+        supabase.table("backfill_jobs").upsert({
+            "telegram_id": user.telegram_id,
+            "cursor_date": start_date.isoformat(),
+            "synced_count": 0,
+            "status": "running",
+        }).execute
+    )
+    _spawn(user, bot)
+
+
+async def resume_backfills(bot: "Bot"):
+    """
+    Restarts all backfill jobs that were interrupted (e.g. by a restart).
+    """
+    try:
+        res = await asyncio.to_thread(
+            supabase.table("backfill_jobs")
+            .select("telegram_id")
+            .eq("status", "running")
+            .execute
+        )
+        for row in res.data:
+            user = await asyncio.to_thread(get_user_tokens, row["telegram_id"])
+            if user and user.access_token:
+                logger.info(f"Resuming backfill for user {user.telegram_id}")
+                _spawn(user, bot)
+    except Exception as e:
+        logger.error(f"Error resuming backfills: {e}")
+
+
+async def stop_backfills():
+    """
+    Cancels running backfills. Their checkpoints stay 'running' so they resume
+    on the next startup.
+    """
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _spawn(user: UserTokens, bot: "Bot"):
+    if user.telegram_id in _tasks:
+        return
+    task = asyncio.create_task(run_backfill(user, bot))
+    _tasks[user.telegram_id] = task
+    task.add_done_callback(lambda _: _tasks.pop(user.telegram_id, None))
+
+
+def _fetch_page(client, after: datetime, before: datetime | None) -> list:
+    # With 'after' set, Strava returns the oldest activities first
+    return list(client.get_activities(after=after, before=before, limit=settings.BACKFILL_PAGE_SIZE))
+
+
+async def run_backfill(user: UserTokens, bot: "Bot"):
+    """
+    Streams a user's activity history page by page into the DB, checkpointing
+    the cursor after each page and reporting progress to the user.
+    """
+    telegram_id = user.telegram_id
+    try:
+        # Supabase and Strava calls block, so run them off the event loop
+        res = await asyncio.to_thread(
+            supabase.table("backfill_jobs")
+            .select("cursor_date, synced_count")
+            .eq("telegram_id", telegram_id)
+            .execute
+        )
+        if not res.data:
+            return
+        cursor = datetime.fromisoformat(res.data[0]["cursor_date"])
+        synced_count = res.data[0]["synced_count"] or 0
+        challenges = await get_user_challenges(telegram_id)
+        _, end_date = get_sync_window(challenges)
+
+        from app.strava_utils import get_strava_client
+        # May refresh the token over HTTP
+        client = await asyncio.to_thread(get_strava_client, user)
+        weights = await refresh_activity_weights()
+
+        logger.info(f"Backfill for user {telegram_id} starting at {cursor.isoformat()}")
+        while True:
+            page = await asyncio.to_thread(_fetch_page, client, cursor, end_date)
+            if not page:
+                break
+
+            rows = [activity_to_row(a, telegram_id, weights) for a in page]
+            rows, scores = attribute_activities(rows, challenges)
+            if rows:
+                await asyncio.to_thread(supabase.table("activities").upsert(rows).execute)
+            if scores:
+                await asyncio.to_thread(supabase.table("challenge_activities").upsert(scores).execute)
+            if rows or scores:
+                bump_activity_data_version()
+
+            cursor = to_naive_utc(page[-1].start_date)
+
+            previous_count = synced_count
+            synced_count += len(rows)
+            await asyncio.to_thread(
+                supabase.table("backfill_jobs").update({
+                    "cursor_date": cursor.isoformat(),
+                    "synced_count": synced_count,
+                    "updated_at": datetime.now(timezone.utc).isoformat(),
+                }).eq("telegram_id", telegram_id).execute
+            )
+
+            every = settings.BACKFILL_PROGRESS_EVERY
+            if synced_count // every > previous_count // every:
+                await _notify(bot, telegram_id, f"🔄 Synced {synced_count} activities…")
+
+            if len(page) < settings.BACKFILL_PAGE_SIZE:
+                break
+
+        await asyncio.to_thread(
+            supabase.table("backfill_jobs").update({
+                "status": "done",
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            }).eq("telegram_id", telegram_id).execute
+        )
+        logger.info(f"Backfill complete for user {telegram_id}: {synced_count} activities.")
+        await _notify(bot, telegram_id, f"✅ Strava sync complete: {synced_count} activities imported.")
+
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        # The job stays 'running' and is resumed from its checkpoint on restart
+        logger.error(f"Backfill failed for user {telegram_id}: {e}")
+
+
+async def _notify(bot: "Bot", telegram_id: int, text: str):
+    try:
+        await bot.send_message(chat_id=telegram_id, text=text)
+    except Exception as e:
+        logger.warning(f"Failed to send backfill progress to {telegram_id}: {e}")
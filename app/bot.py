@@ -10,7 +10,22 @@ from telegram.ext import (
 from core.config import settings
 from stravalib.client import Client
 from db.supabase import supabase
+from db.write_buffer import write_buffer
 from app.sync import sync_for_user, sync_all_users
+from app.ocr import process_ocr_activity, ocr_activity_id
+from core.scoring import calculate_weighted_distance, refresh_activity_weights
+from core.challenges import (
+    attribute_activities,
+    get_challenges,
+    get_chat_challenge,
+    get_user_challenges,
+    pick_current,
+)
+from db.models import Challenge
+from db.queries import get_display_names
+from db.versions import activity_data_version
+from app.chart import chart_cache, get_cumulative_scores, render_chart
+from app.workers import run_in_process
 
 
 async def check_phone_allowed(phone_number: str) -> bool:
@@ -26,7 +41,7 @@ async def check_phone_allowed(phone_number: str) -> bool:
         # We try strict match or match without leading + if DB has it stored differently
         res = (
             supabase.table("allowed_numbers")
-            .select("*")
+            .select("phone_number")
             .or_(f"phone_number.eq.{phone_number},phone_number.eq.+{phone_number}")
             .execute()
         )
@@ -64,9 +79,9 @@ async def is_user_verified(update: Update) -> bool:
 
             # Sync username if it changed or is missing
             if user.username and user_data.get("telegram_username") != user.username:
-                supabase.table("users").update({"telegram_username": user.username}).eq(
-                    "telegram_id", user.id
-                ).execute()
+                write_buffer.upsert(
+                    "users", {"telegram_id": user.id, "telegram_username": user.username}
+                )
 
             if user_data.get("is_verified", False):
                 return True
@@ -88,6 +103,35 @@ async def is_user_verified(update: Update) -> bool:
         return False
 
 
+async def resolve_challenge(update: Update) -> Challenge | None:
+    """
+    Returns the challenge a command refers to: the challenge of the group chat,
+    or in a private chat the user's current challenge. None if there is none.
+
+    Group chats never fall back to the user's challenges, that would show
+    another group's leaderboard in this chat.
+    """
+    chat = update.effective_chat
+    if chat and chat.type != "private":
+        return await get_chat_challenge(chat.id)
+    return pick_current(await get_user_challenges(update.effective_user.id))
+
+
+async def reply_if_no_challenge(update: Update, challenge: Challenge | None) -> bool:
+    """
+    Replies and returns True if challenges are configured but none applies.
+    Without any challenges the commands work on all activities, as before.
+    """
+    if challenge is not None or not await get_challenges():
+        return False
+
+    if update.effective_chat and update.effective_chat.type != "private":
+        await update.message.reply_text("No challenge is configured for this chat.")
+    else:
+        await update.message.reply_text("You are not part of any challenge yet.")
+    return True
+
+
 async def request_verification(update: Update):
     """Prompts the user to share their phone number."""
     contact_keyboard = KeyboardButton(
@@ -151,7 +195,10 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Use /stats to see your total weighted distance.\n"
         "Use /activities to list your recent activities.\n"
         "Use /top to see the leaderboard.\n"
-        "Use /weights to see current conversion factors."
+        "Use /chart to see everyone's progress over time.\n"
+        "Use /challenges to list the challenges you take part in.\n"
+        "Use /weights to see current conversion factors.\n"
+        "Send a photo of a treadmill or watch screen to submit an activity without Strava."
     )
 
 
@@ -211,18 +258,31 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await context.bot.send_chat_action(
         chat_id=update.effective_chat.id, action="typing"
     )
+    challenge = await resolve_challenge(update)
+    if await reply_if_no_challenge(update, challenge):
+        return
+
     await sync_for_user(user_id)
     try:
-        response = (
-            supabase.table("activities")
-            .select("weighted_distance")
-            .eq("user_id", user_id)
-            .execute()
-        )
+        if challenge is not None:
+            response = (
+                supabase.table("challenge_activities")
+                .select("weighted_distance")
+                .eq("challenge_id", challenge.id)
+                .eq("user_id", user_id)
+                .execute()
+            )
+            title = f"📊 {challenge.name} - Your Total Weighted Distance"
+        else:
+            response = (
+                supabase.table("activities")
+                .select("weighted_distance")
+                .eq("user_id", user_id)
+                .execute()
+            )
+            title = "📊 Your Total Weighted Distance"
         total = sum(item["weighted_distance"] for item in response.data)
-        await update.message.reply_text(
-            f"📊 Your Total Weighted Distance: {total:.2f} km"
-        )
+        await update.message.reply_text(f"{title}: {total:.2f} km")
     except Exception as e:
         await update.message.reply_text(f"Error fetching stats: {e}")
 
@@ -235,12 +295,27 @@ async def top_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await context.bot.send_chat_action(
         chat_id=update.effective_chat.id, action="typing"
     )
-    await sync_all_users()
+    challenge = await resolve_challenge(update)
+    if await reply_if_no_challenge(update, challenge):
+        return
+
+    # With the background scheduler running the data is kept up to date,
+    # so the leaderboard can be read directly.
+    if not settings.SYNC_SCHEDULER_ENABLED:
+        await sync_all_users()
 
     try:
-        response = (
-            supabase.table("activities").select("user_id, weighted_distance").execute()
-        )
+        if challenge is not None:
+            response = (
+                supabase.table("challenge_activities")
+                .select("user_id, weighted_distance")
+                .eq("challenge_id", challenge.id)
+                .execute()
+            )
+        else:
+            response = (
+                supabase.table("activities").select("user_id, weighted_distance").execute()
+            )
         totals = {}
         for item in response.data:
             uid = item["user_id"]
@@ -250,27 +325,15 @@ async def top_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         names_map = {}
         if sorted_users:
-            top_ids = [u[0] for u in sorted_users]
             try:
-                user_res = (
-                    supabase.table("users")
-                    .select("telegram_id, first_name, last_name, telegram_username")
-                    .in_("telegram_id", top_ids)
-                    .execute()
-                )
-                for u in user_res.data:
-                    # Logic: first + last > telegram_username > ID
-                    display_name = f"{u.get('first_name') or ''} {u.get('last_name') or ''}".strip()
-                    if not display_name:
-                        if u.get("telegram_username"):
-                            display_name = f"@{u['telegram_username']}"
-                        else:
-                            display_name = f"User {u['telegram_id']}"
-                    names_map[u["telegram_id"]] = display_name
+                names_map = get_display_names([u[0] for u in sorted_users])
             except Exception as e:
                 print(f"Error fetching names: {e}")
 
-        msg = "🏆 Leaderboard:\n"
+        if challenge is not None:
+            msg = f"🏆 {challenge.name} Leaderboard:\n"
+        else:
+            msg = "🏆 Leaderboard:\n"
         for i, (uid, dist) in enumerate(sorted_users, 1):
             name = names_map.get(uid, f"User {uid}")
             msg += f"{i}. {name}: {dist:.2f} km\n"
@@ -283,6 +346,42 @@ async def top_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(f"Error fetching leaderboard: {e}")
 
 
+async def chart_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Sends a chart of the cumulative weighted km per member over time."""
+    if not await is_user_verified(update):
+        await request_verification(update)
+        return
+
+    challenge = await resolve_challenge(update)
+    if await reply_if_no_challenge(update, challenge):
+        return
+
+    challenge_id = challenge.id if challenge is not None else None
+    # Taken before reading the data, so a concurrent write invalidates the entry
+    version = activity_data_version()
+
+    try:
+        file_id = chart_cache.get(challenge_id, version)
+        if file_id is not None:
+            await update.message.reply_photo(file_id)
+            return
+
+        await context.bot.send_chat_action(
+            chat_id=update.effective_chat.id, action="upload_photo"
+        )
+        series = get_cumulative_scores(challenge)
+        if not series:
+            await update.message.reply_text("No activities yet!")
+            return
+
+        title = f"{challenge.name} Progress" if challenge is not None else "Challenge Progress"
+        png = await run_in_process(render_chart, title, series)
+        message = await update.message.reply_photo(png)
+        chart_cache.put(challenge_id, version, message.photo[-1].file_id)
+    except Exception as e:
+        await update.message.reply_text(f"Error creating chart: {e}")
+
+
 async def activities_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await is_user_verified(update):
         await request_verification(update)
@@ -331,14 +430,19 @@ async def activities_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def weights_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Shows the current activity weights/conversion factors."""
-    from core.scoring import refresh_activity_weights
-
     await context.bot.send_chat_action(
         chat_id=update.effective_chat.id, action="typing"
     )
-    weights = await refresh_activity_weights()
+    challenge = await resolve_challenge(update)
+    if await reply_if_no_challenge(update, challenge):
+        return
 
-    msg = "⚖️ Activity Conversion Factors:\n(Distance * Weight = Score)\n\n"
+    if challenge is not None:
+        weights = challenge.weights
+        msg = f"⚖️ {challenge.name} Conversion Factors:\n(Distance * Weight = Score)\n\n"
+    else:
+        weights = await refresh_activity_weights()
+        msg = "⚖️ Activity Conversion Factors:\n(Distance * Weight = Score)\n\n"
     # Filter out 0.0 weights
     active_weights = {k: v for k, v in weights.items() if v > 0}
 
@@ -348,6 +452,24 @@ async def weights_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(msg)
 
 
+async def challenges_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Lists the challenges the user takes part in."""
+    if not await is_user_verified(update):
+        await request_verification(update)
+        return
+
+    challenges = await get_user_challenges(update.effective_user.id)
+    if not challenges:
+        await update.message.reply_text("You are not part of any challenge yet.")
+        return
+
+    msg = "🏁 Your Challenges:\n\n"
+    for challenge in sorted(challenges, key=lambda c: c.start_date, reverse=True):
+        end_str = challenge.end_date.date().isoformat() if challenge.end_date else "open"
+        msg += f"• {challenge.name}: {challenge.start_date.date().isoformat()} - {end_str}\n"
+    await update.message.reply_text(msg)
+
+
 async def welcome_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
     for member in update.message.new_chat_members:
         if member.id == context.bot.id:
@@ -360,6 +482,70 @@ async def welcome_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
 
 
+async def photo_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Reads an activity from a treadmill/watch screenshot and stores it.
+    """
+    if not await is_user_verified(update):
+        await request_verification(update)
+        return
+
+    user_id = update.effective_user.id
+    await context.bot.send_chat_action(
+        chat_id=update.effective_chat.id, action="typing"
+    )
+    try:
+        # The last photo size is the largest
+        photo = update.message.photo[-1]
+        photo_file = await photo.get_file()
+        photo_data = bytes(await photo_file.download_as_bytearray())
+        result = await process_ocr_activity(photo_data, update.message.caption)
+    except Exception as e:
+        await update.message.reply_text(f"Error reading photo: {e}")
+        return
+
+    if result is None:
+        await update.message.reply_text(
+            "❌ Could not recognize a plausible activity in this photo.\n"
+            "Make sure the total distance is clearly readable and add the sport (Run, Ride, Swim) as caption."
+        )
+        return
+
+    weights = await refresh_activity_weights()
+    weighted_km = calculate_weighted_distance(
+        result["type"], result["distance"], custom_weights=weights
+    )
+    distance_km = result["distance"] / 1000.0
+    activity_data = {
+        "activity_id": ocr_activity_id(photo.file_unique_id),
+        "user_id": user_id,
+        "type": result["type"],
+        "distance": distance_km,
+        "weighted_distance": weighted_km,
+        "name": "Photo submission",
+        "start_date": update.message.date.isoformat(),
+    }
+    kept, scores = attribute_activities(
+        [activity_data], await get_user_challenges(user_id)
+    )
+    if not kept:
+        await update.message.reply_text(
+            f"❌ Activity type {result['type']} is not allowed."
+        )
+        return
+
+    write_buffer.upsert("activities", activity_data)
+    if scores:
+        write_buffer.upsert("challenge_activities", scores)
+
+    await update.message.reply_text(
+        f"📷 Activity Recorded!\n"
+        f"Type: {result['type']}\n"
+        f"Dist: {distance_km:.2f} km\n"
+        f"Weighted: {weighted_km:.2f} km"
+    )
+
+
 def create_bot_application() -> Application:
     app = ApplicationBuilder().token(settings.TELEGRAM_BOT_TOKEN).build()
 
@@ -368,9 +554,14 @@ def create_bot_application() -> Application:
     app.add_handler(CommandHandler("name", name_command))
     app.add_handler(CommandHandler("stats", stats_command))
     app.add_handler(CommandHandler("top", top_command))
+    app.add_handler(CommandHandler("chart", chart_command))
     app.add_handler(CommandHandler("activities", activities_command))
     app.add_handler(CommandHandler("weights", weights_command))
+    app.add_handler(CommandHandler("challenges", challenges_command))
     app.add_handler(MessageHandler(filters.CONTACT, contact_handler))
+    app.add_handler(
+        MessageHandler(filters.PHOTO & filters.ChatType.PRIVATE, photo_handler)
+    )
     app.add_handler(
         MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, welcome_new_member)
     )
@@ -0,0 +1,99 @@
+import io
+from datetime import date
+from db.supabase import supabase
+from db.models import Challenge, to_naive_utc
+from db.queries import get_display_names
+
+
+class ChartCache:
+    """
+    Telegram file_ids of rendered charts, keyed by challenge.
+
+    An entry is only valid for the activity data version it was rendered
+    from, so a chart is re-rendered only after new activity data arrived.
+    """
+
+    def __init__(self):
+        # challenge id (None without challenges) -> (data version, file_id)
+        self._entries: dict[int | None, tuple[int, str]] = {}
+
+    def get(self, challenge_id: int | None, version: int) -> str | None:
+        entry = self._entries.get(challenge_id)
+        if entry is None or entry[0] != version:
+            return None
+        return entry[1]
+
+    def put(self, challenge_id: int | None, version: int, file_id: str):
+        self._entries[challenge_id] = (version, file_id)
+
+
+chart_cache = ChartCache()
+
+
+def get_cumulative_scores(challenge: Challenge | None) -> dict[str, list[tuple[date, float]]]:
+    """
+    Returns the cumulative weighted km per member and day, keyed by display name.
+    """
+    if challenge is not None:
+        res = (
+            supabase.table("challenge_activities")
+            .select("user_id, weighted_distance, start_date")
+            .eq("challenge_id", challenge.id)
+            .execute()
+        )
+    else:
+        res = (
+            supabase.table("activities")
+            .select("user_id, weighted_distance, start_date")
+            .execute()
+        )
+
+    daily: dict[int, dict[date, float]] = {}
+    for item in res.data:
+        if not item["weighted_distance"]:
+            continue
+        day = to_naive_utc(item["start_date"]).date()
+        user_days = daily.setdefault(item["user_id"], {})
+        user_days[day] = user_days.get(day, 0) + item["weighted_distance"]
+    if not daily:
+        return {}
+
+    names = get_display_names(list(daily))
+    series = {}
+    for uid, days in daily.items():
+        total = 0.0
+        points = []
+        for day in sorted(days):
+            total += days[day]
+            points.append((day, total))
+        series[names.get(uid, f"User {uid}")] = points
+    return series
+
+
+def render_chart(title: str, series: dict[str, list[tuple[date, float]]]) -> bytes:
+    """
+    Renders the cumulative scores as a PNG. Executed in a worker process.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+
+    fig, ax = plt.subplots(figsize=(10, 6), dpi=100)
+    # Leader first, so the legend reads like the leaderboard
+    for name, points in sorted(series.items(), key=lambda s: s[1][-1][1], reverse=True):
+        days = [day for day, _ in points]
+        totals = [total for _, total in points]
+        ax.step(days, totals, where="post", label=f"{name} ({totals[-1]:.1f} km)")
+
+    ax.set_title(title)
+    ax.set_ylabel("Weighted km")
+    ax.grid(True, alpha=0.3)
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%d.%m."))
+    ax.legend(loc="upper left")
+    fig.autofmt_xdate()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    plt.close(fig)
+    return buffer.getvalue()
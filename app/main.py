@@ -1,9 +1,13 @@
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from core.config import settings
+from core.config import get_settings, settings
+from db.supabase import get_supabase
 from app.routes import router
-from app.bot import create_bot_application
+from app.scheduler import sync_scheduler
+from app.backfill import resume_backfills, stop_backfills
+from db.write_buffer import write_buffer
+from app.workers import shutdown_workers
 
 # Configure logging
 logging.basicConfig(
@@ -14,7 +18,15 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Initialize bot
+    # Startup: Load settings and clients (deferred until now so imports stay cheap)
+    get_settings()
+    app.title = settings.PROJECT_NAME
+    get_supabase()
+
+    # Imported here as it pulls in python-telegram-bot and stravalib
+    from app.bot import create_bot_application
+
+    # Initialize bot
     logger.info("Starting up Telegram Bot...")
     bot_app = create_bot_application()
     await bot_app.initialize()
@@ -29,17 +41,28 @@ async def lifespan(app: FastAPI):
     
     # Store bot_app in state
     app.state.bot_app = bot_app
+
+    # Continue backfills that were interrupted by a restart
+    await resume_backfills(bot_app.bot)
+
+    if settings.SYNC_SCHEDULER_ENABLED:
+        logger.info("Starting background sync scheduler...")
+        sync_scheduler.start()
     
     yield
     
     # Shutdown
     logger.info("Shutting down...")
+    await sync_scheduler.stop()
+    await stop_backfills()
+    await write_buffer.close()
+    shutdown_workers()
     await bot_app.updater.stop()
     await bot_app.stop()
     await bot_app.shutdown()
 
+# The title is set from the settings in the lifespan
 app = FastAPI(
-    title=settings.PROJECT_NAME,
     lifespan=lifespan
 )
 
@@ -1,16 +1,125 @@
-async def process_ocr_activity(photo_data: bytes) -> dict:
+import hashlib
+import io
+import re
+from app.workers import run_in_process
+
+# Images are downscaled to this size (longest side) before OCR
+MAX_IMAGE_SIDE = 1600
+
+# Whole words naming the sport explicitly
+SPORT_KEYWORDS = {
+    "Run": re.compile(r"\b(run|runs|running|treadmill|jog|jogging)\b", re.IGNORECASE),
+    "Ride": re.compile(r"\b(ride|rides|riding|bike|biking|cycle|cycling|spin|spinning)\b", re.IGNORECASE),
+    "Swim": re.compile(r"\b(swim|swims|swimming|pool)\b", re.IGNORECASE),
+}
+# Generic words that only hint at a sport, used if no explicit keyword is found
+SPORT_HINTS = {
+    "Swim": re.compile(r"\b(lap|laps|lengths?)\b", re.IGNORECASE),
+}
+
+# A number followed by a distance unit, but not a speed/pace like "km/h".
+# "1,234" with exactly three digits after the comma is a thousands separator.
+DISTANCE_PATTERN = re.compile(
+    r"(\d{1,3}(?:,\d{3})+(?![\d.,])|\d+(?:[.,]\d+)?)\s*(km|mi|m)\b(?!\s*/)", re.IGNORECASE
+)
+
+UNIT_METERS = {"km": 1000.0, "mi": 1609.344, "m": 1.0}
+
+# Plausible distance range per sport in meters. Values outside are most likely
+# misread (e.g. a dropped decimal point turning 5.02 km into 502 km).
+DISTANCE_LIMITS = {
+    "Run": (200.0, 100_000.0),
+    "Ride": (500.0, 400_000.0),
+    "Swim": (25.0, 20_000.0),
+}
+
+
+def extract_text(photo_data: bytes) -> str:
     """
-    Mock function to process OCR from photo data.
+    Runs Tesseract on the photo. Executed in a worker process.
+    """
+    from PIL import Image, ImageOps
+    import pytesseract
+
+    image = Image.open(io.BytesIO(photo_data))
+    image = ImageOps.exif_transpose(image).convert("L")
+    image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+    return pytesseract.image_to_string(image)
+
+
+def detect_sport(text: str) -> str | None:
+    """
+    Returns the sport named in the text. If several are named, the first
+    mention wins; generic hints ("laps") only count if none is named.
+    """
+    for keywords in (SPORT_KEYWORDS, SPORT_HINTS):
+        matches = [
+            (match.start(), sport)
+            for sport, pattern in keywords.items()
+            if (match := pattern.search(text))
+        ]
+        if matches:
+            return min(matches)[1]
+    return None
+
+
+def parse_distance(text: str) -> float | None:
+    """
+    Returns the largest distance found in the text, in meters.
+    Summary screens show the total next to splits, so the largest value wins.
+    """
+    distances = [
+        _parse_number(value) * UNIT_METERS[unit.lower()]
+        for value, unit in DISTANCE_PATTERN.findall(text)
+    ]
+    return max(distances) if distances else None
+
+
+def _parse_number(value: str) -> float:
+    # "1,234" (thousands) vs. "5,02" (decimal comma)
+    if re.fullmatch(r"\d{1,3}(?:,\d{3})+", value):
+        return float(value.replace(",", ""))
+    return float(value.replace(",", "."))
+
+
+def is_plausible_distance(sport: str, distance: float) -> bool:
+    low, high = DISTANCE_LIMITS.get(sport, (0.0, float("inf")))
+    return low <= distance <= high
+
+
+def ocr_activity_id(file_unique_id: str) -> int:
+    """
+    Derives a stable activity ID for a photo submission.
+    Negative so it never collides with Strava IDs; the same photo maps to the
+    same ID, so resubmitting it does not count twice.
+    """
+    digest = hashlib.sha256(file_unique_id.encode()).digest()
+    return -int.from_bytes(digest[:7], "big")
+
+
+async def process_ocr_activity(photo_data: bytes, caption: str | None = None) -> dict | None:
+    """
+    Reads an activity from a treadmill or watch screenshot.
     
     Args:
         photo_data: The binary content of the photo.
+        caption: Optional photo caption, checked first for the sport type.
         
     Returns:
-        dict: A dictionary containing the mock activity data.
+        dict: The activity type, distance in meters and raw OCR text,
+        or None if no sport type or no plausible distance was recognized.
     """
-    # Simulate processing logic
+    raw_text = await run_in_process(extract_text, photo_data)
+
+    sport = detect_sport(caption or "") or detect_sport(raw_text)
+    distance = parse_distance(raw_text)
+    if sport is None or distance is None:
+        return None
+    if not is_plausible_distance(sport, distance):
+        return None
+
     return {
-        "type": "Run",
-        "distance": 5000, # Mock distance in meters
-        "raw_text": "Mocked OCR Result: 5.0km Run"
+        "type": sport,
+        "distance": distance,
+        "raw_text": raw_text
     }
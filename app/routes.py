@@ -1,8 +1,12 @@
 from fastapi import APIRouter, BackgroundTasks, Request
-from stravalib.client import Client
 from core.config import settings
 from db.supabase import supabase
-from app.sync import sync_user_activities
+from db.models import UserTokens
+from db.athlete_cache import athlete_cache
+from db.write_buffer import write_buffer
+from db.idempotency import webhook_events
+from app.backfill import start_backfill
+from app.scheduler import sync_scheduler
 
 router = APIRouter()
 
@@ -10,6 +14,7 @@ def ensure_strava_webhook(callback_url: str):
     """
     Ensures that the Strava webhook subscription exists for this app.
     """
+    from stravalib.client import Client
     client = Client()
     try:
         subscriptions = client.list_subscriptions(
@@ -37,6 +42,7 @@ async def strava_auth(request: Request, code: str, state: str, background_tasks:
     Callback endpoint for Strava OAuth.
     Exchanges code for token and saves it with Telegram ID (state).
     """
+    from stravalib.client import Client
     client = Client()
     try:
         # Exchange code for tokens
@@ -61,6 +67,9 @@ async def strava_auth(request: Request, code: str, state: str, background_tasks:
         # Save to Supabase (upsert)
         # Using execute() to run the query
         data, count = supabase.table("users").upsert(user_data).execute()
+        user = UserTokens.from_row(user_data)
+        if user_data["athlete_id"] is not None:
+            athlete_cache.put(user_data["athlete_id"], user)
         
         # Ensure webhook is setup
         base_url = str(request.base_url).rstrip('/')
@@ -68,8 +77,8 @@ async def strava_auth(request: Request, code: str, state: str, background_tasks:
         callback_url = f"{base_url}/strava/webhook"
         background_tasks.add_task(ensure_strava_webhook, callback_url)
         
-        # Trigger background sync
-        background_tasks.add_task(sync_user_activities, user_data)
+        # Start the resumable history backfill
+        await start_backfill(user, request.app.state.bot_app.bot)
         
         return {"message": "Authorization successful! Syncing your activities... You can close this window and return to Telegram."}
         
@@ -77,9 +86,9 @@ async def strava_auth(request: Request, code: str, state: str, background_tasks:
         return {"error": f"Authorization failed: {str(e)}"}
 
 from pydantic import BaseModel
-from telegram.error import TelegramError
-from app.bot import create_bot_application
-from core.scoring import calculate_weighted_distance, refresh_activity_weights
+from core.scoring import refresh_activity_weights
+from core.challenges import attribute_activities, get_user_challenges
+from app.sync import activity_to_row
 import time
 
 class WebhookEvent(BaseModel):
@@ -105,17 +114,21 @@ async def strava_webhook_verify_endpoint(
     return {"error": "Invalid token"}
 
 @router.post("/strava/webhook")
-async def strava_webhook_event(event: WebhookEvent):
+async def strava_webhook_event(event: WebhookEvent, request: Request):
     # Process only activity creation
     if event.object_type == "activity" and event.aspect_type == "create":
         # 1. Get user from DB
-        response = supabase.table("users").select("*").eq("athlete_id", event.owner_id).execute()
-        if not response.data:
+        user = await athlete_cache.get(event.owner_id)
+        if user is None:
             print(f"User not found for athlete_id: {event.owner_id}")
             return {"status": "User not found"}
         
-        user = response.data[0]
-        telegram_id = user["telegram_id"]
+        telegram_id = user.telegram_id
+
+        # Strava retries deliveries: acknowledge duplicates without processing them
+        event_key = (event.subscription_id, event.object_id, event.aspect_type, event.event_time)
+        if not await webhook_events.claim(event_key):
+            return {"status": "Duplicate"}
         
         # 2. Fetch Activity Details (Need valid token)
         try:
@@ -123,50 +136,34 @@ async def strava_webhook_event(event: WebhookEvent):
             client = get_strava_client(user)
         except Exception as e:
             print(f"Failed to get valid Strava client for user {telegram_id}: {e}")
+            await webhook_events.release(event_key)
             return {"status": "Token refresh failed"}
 
         try:
             activity = client.get_activity(event.object_id)
             
-            # Safe handling for Stravalib versions
-            distance_val = activity.distance
-            if hasattr(distance_val, 'num'): 
-                distance_meters = distance_val.num
-            elif hasattr(distance_val, 'magnitude'):
-                distance_meters = distance_val.magnitude
-            else:
-                distance_meters = float(distance_val)
-                
-            activity_type = activity.type
-            if hasattr(activity_type, 'root'):
-                activity_type_str = str(activity_type.root)
-            else:
-                activity_type_str = str(activity_type)
-
-            distance_km = distance_meters / 1000.0
-            
-            # 3. Calculate Score
+            # 3. Calculate Score (globally and per challenge)
             weights = await refresh_activity_weights()
-            weighted_km = calculate_weighted_distance(activity_type_str, distance_meters, custom_weights=weights) 
+            challenges = await get_user_challenges(telegram_id)
+            activity_data = activity_to_row(activity, telegram_id, weights)
+            kept, scores = attribute_activities([activity_data], challenges)
 
             # Only process allowed types (Ride, Run, Swim)
-            if weighted_km <= 0:
-                print(f"Skipping webhook activity {event.object_id} - type {activity_type_str} is not allowed.")
+            if not kept:
+                print(f"Skipping webhook activity {event.object_id} - type {activity_data['type']} is not allowed.")
                 return {"status": "Activity type not allowed"}
 
-            activity_data = {
-                "activity_id": event.object_id,
-                "user_id": telegram_id,
-                "type": activity_type_str,
-                "distance": float(distance_km),
-                "weighted_distance": weighted_km,
-                "name": activity.name,
-                "start_date": activity.start_date.isoformat()
-            }
-            supabase.table("activities").upsert(activity_data).execute()
+            activity_type_str = activity_data["type"]
+            distance_km = activity_data["distance"]
+            weighted_km = activity_data["weighted_distance"]
+
+            write_buffer.upsert("activities", activity_data)
+            if scores:
+                write_buffer.upsert("challenge_activities", scores)
+            sync_scheduler.mark_fresh(telegram_id)
             
             # 5. Notify User
-            bot = create_bot_application().bot
+            bot = request.app.state.bot_app.bot
             msg = (
                 f"🏃 New Activity Processed!\n"
                 f"Type: {activity_type_str}\n"
@@ -179,6 +176,7 @@ async def strava_webhook_event(event: WebhookEvent):
             
         except Exception as e:
             print(f"Error processing activity: {e}")
+            await webhook_events.release(event_key)
             return {"status": "Error processing"}
 
     return {"status": "ok"}
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import time
+from core.config import settings
+from db.queries import get_connected_users
+from app.sync import sync_user_incremental
+from app.backfill import is_backfilling
+
+logger = logging.getLogger(__name__)
+
+
+class SyncScheduler:
+    """
+    Periodically reconciles every connected user with Strava.
+
+    Each pass spreads the users evenly across the sync interval instead of
+    syncing them back to back, so Strava API calls are not bursty. Users that
+    received webhook data recently are skipped.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+        # telegram_id -> time.monotonic() of the last webhook/sync for that user
+        self._last_seen: dict[int, float] = {}
+
+    def mark_fresh(self, telegram_id: int):
+        """Records that the user's data was just updated (e.g. by a webhook)."""
+        self._last_seen[telegram_id] = time.monotonic()
+
+    def is_fresh(self, telegram_id: int) -> bool:
+        last_seen = self._last_seen.get(telegram_id)
+        if last_seen is None:
+            return False
+        return time.monotonic() - last_seen < settings.SYNC_FRESHNESS_MINUTES * 60
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        interval = settings.SYNC_INTERVAL_MINUTES * 60
+        while True:
+            started = time.monotonic()
+            try:
+                await self._sync_pass(interval)
+            except Exception as e:
+                logger.error(f"Scheduled sync pass failed: {e}")
+            # Wait for the rest of the interval if the pass finished early
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    async def _sync_pass(self, interval: float):
+        users = await asyncio.to_thread(get_connected_users)
+        if not users:
+            return
+
+        slot = interval / len(users)
+        logger.info(f"Scheduled sync: {len(users)} users, one every {slot:.0f}s")
+        for user in users:
+            slot_start = time.monotonic()
+            if self.is_fresh(user.telegram_id) or is_backfilling(user.telegram_id):
+                logger.info(f"Skipping scheduled sync for {user.telegram_id}: data is recent.")
+            else:
+                await sync_user_incremental(user)
+                self.mark_fresh(user.telegram_id)
+            await asyncio.sleep(max(0.0, slot - (time.monotonic() - slot_start)))
+
+
+sync_scheduler = SyncScheduler()
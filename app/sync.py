@@ -1,124 +1,282 @@
-from datetime import datetime
+import asyncio
+from datetime import datetime, timedelta
 from core.config import settings
 from db.supabase import supabase
+from db.models import UserTokens, to_naive_utc
+from db.queries import (
+    get_activity_scores,
+    get_challenge_scores,
+    get_connected_users,
+    get_stored_activities,
+    get_user_tokens,
+)
+from db.write_buffer import write_buffer
+from db.versions import bump_activity_data_version
 from core.scoring import calculate_weighted_distance, refresh_activity_weights
+from core.challenges import (
+    attribute_activities,
+    get_sync_window,
+    get_user_challenges,
+    score_for_challenges,
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
-async def sync_user_activities(user_data: dict):
+# telegram_id -> scoring fingerprint the user's stored scores were last
+# reconciled with, so they are only re-weighted after weights or challenges change
+_reconciled: dict[int, tuple] = {}
+
+def activity_to_row(activity, telegram_id: int, weights: dict) -> dict:
+    """
+    Converts a Strava activity into an 'activities' row, scored with the
+    global weights. Whether it is stored is decided by attribute_activities().
+    """
+    distance_val = activity.distance
+    if hasattr(distance_val, 'num'): 
+        distance_meters = distance_val.num
+    elif hasattr(distance_val, 'magnitude'):
+        distance_meters = distance_val.magnitude
+    else:
+        distance_meters = float(distance_val)
+        
+    activity_type = activity.type
+    if hasattr(activity_type, 'root'):
+        activity_type_str = str(activity_type.root)
+    else:
+        activity_type_str = str(activity_type)
+    
+    weighted_km = calculate_weighted_distance(activity_type_str, distance_meters, custom_weights=weights)
+    return {
+        "activity_id": activity.id,
+        "user_id": telegram_id,
+        "type": activity_type_str,
+        "distance": distance_meters / 1000.0,
+        "weighted_distance": weighted_km,
+        "name": activity.name,
+        "start_date": activity.start_date.isoformat()
+    }
+
+def is_unchanged(row: dict, stored: dict | None) -> bool:
+    """Whether an activity row equals its stored version, so writing it is a no-op."""
+    if stored is None:
+        return False
+    return (
+        stored["type"] == row["type"]
+        and stored["name"] == row["name"]
+        and abs(float(stored["distance"]) - row["distance"]) < 0.001
+        and abs(float(stored["weighted_distance"]) - row["weighted_distance"]) < 0.001
+        and to_naive_utc(stored["start_date"]) == to_naive_utc(row["start_date"])
+    )
+
+def is_score_unchanged(score: dict, stored_scores: dict[tuple[int, int], float]) -> bool:
+    stored = stored_scores.get((score["challenge_id"], score["activity_id"]))
+    return stored is not None and abs(stored - score["weighted_distance"]) < 0.001
+
+def scoring_fingerprint(weights: dict, challenges: list) -> tuple:
+    """Everything the stored scores of a user depend on besides the activities themselves."""
+    return (
+        tuple(sorted(weights.items())),
+        tuple(sorted(
+            (c.id, c.start_date, c.end_date, tuple(sorted(c.weights.items()))) for c in challenges
+        )),
+    )
+
+def _fetch_activities(user: UserTokens, after: datetime, before: datetime | None) -> list:
+    from app.strava_utils import get_strava_client
+    client = get_strava_client(user)
+    return list(client.get_activities(after=after, before=before, limit=None))
+
+async def sync_user_activities(user: UserTokens, after: datetime | None = None):
     """
-    Syncs activities for a user within the configured date range.
+    Syncs activities for a user within the date range of their challenges
+    (or the configured date range if they are in none).
+    Activities are fetched once and attributed to every matching challenge.
     Uses bulk upsert for efficiency.
+
+    If 'after' is given, only activities started after it are fetched
+    (it is clamped to the sync start date).
     """
-    if not settings.STRAVA_SYNC_START_DATE:
+    challenges = await get_user_challenges(user.telegram_id)
+    start_date, end_date = get_sync_window(challenges)
+    if start_date is None:
         logger.info("No sync start date configured. Skipping sync.")
         return
+    if after and after > start_date:
+        start_date = after
 
-    logger.info(f"Starting sync for user {user_data['telegram_id']}...")
-    from app.strava_utils import get_strava_client
-    client = get_strava_client(user_data)
+    logger.info(f"Starting sync for user {user.telegram_id}...")
     
     # Fetch current weights from DB
     weights = await refresh_activity_weights()
-    
-    start_date = datetime.strptime(settings.STRAVA_SYNC_START_DATE, "%Y-%m-%d")
-    end_date = None
-    if settings.STRAVA_SYNC_END_DATE:
-        end_date = datetime.strptime(settings.STRAVA_SYNC_END_DATE, "%Y-%m-%d")
 
     try:
-        # get_activities returns an iterator
-        activities = client.get_activities(after=start_date, before=end_date, limit=None)
+        # Strava HTTP calls (incl. token refresh) block, so run them off the event loop
+        activities = await asyncio.to_thread(_fetch_activities, user, start_date, end_date)
         
-        u_activities = []
-        for activity in activities:
-            distance_val = activity.distance
-            if hasattr(distance_val, 'num'): 
-                distance_meters = distance_val.num
-            elif hasattr(distance_val, 'magnitude'):
-                distance_meters = distance_val.magnitude
-            else:
-                distance_meters = float(distance_val)
-                
-            activity_type = activity.type
-            if hasattr(activity_type, 'root'):
-                activity_type_str = str(activity_type.root)
-            else:
-                activity_type_str = str(activity_type)
-            
-            distance_km = distance_meters / 1000.0
-            weighted_km = calculate_weighted_distance(activity_type_str, distance_meters, custom_weights=weights)
-            
-            # ONLY allow Ride, Run, and Swim (activities with weight > 0)
-            if weighted_km <= 0:
-                logger.info(f"Skipping activity {activity.id} (type: {activity_type_str}) as it is not an allowed type.")
-                continue
-
-            u_activities.append({
-                "activity_id": activity.id,
-                "user_id": user_data['telegram_id'],
-                "type": activity_type_str,
-                "distance": distance_km,
-                "weighted_distance": weighted_km,
-                "name": activity.name,
-                "start_date": activity.start_date.isoformat()
-            })
-            
+        rows = [activity_to_row(activity, user.telegram_id, weights) for activity in activities]
+        # ONLY keep allowed types (weight > 0 globally or in one of the challenges)
+        u_activities, scores = attribute_activities(rows, challenges)
+        if len(u_activities) < len(rows):
+            logger.info(f"Skipped {len(rows) - len(u_activities)} activities of types that are not allowed.")
+
+        # Only write what changed: unchanged rows would still count as new
+        # activity data and invalidate the cached charts
+        stored = await asyncio.to_thread(get_stored_activities, user.telegram_id, start_date)
+        stored_scores = await asyncio.to_thread(get_challenge_scores, user.telegram_id, start_date)
+        changed_ids = {
+            row["activity_id"] for row in u_activities
+            if not is_unchanged(row, stored.get(row["activity_id"]))
+        }
+        u_activities = [row for row in u_activities if row["activity_id"] in changed_ids]
+        scores = [
+            score for score in scores
+            if score["activity_id"] in changed_ids or not is_score_unchanged(score, stored_scores)
+        ]
+
         if u_activities:
-            # Chunking bulk upsert if necessary (Supabase handled well up to ~1000)
-            supabase.table("activities").upsert(u_activities).execute()
+            # Coalesced with other pending writes into one bulk upsert
+            write_buffer.upsert("activities", u_activities)
+        if scores:
+            write_buffer.upsert("challenge_activities", scores)
         
         # Also ensure all OLD activities for this user are updated if weights changed
-        await refresh_all_weighted_distances(user_data['telegram_id'])
+        await refresh_all_weighted_distances(user.telegram_id, weights, challenges)
             
-        logger.info(f"Sync complete for user {user_data['telegram_id']}: {len(u_activities)} activities synced.")
+        logger.info(f"Sync complete for user {user.telegram_id}: {len(u_activities)} new or changed activities.")
         
     except Exception as e:
-        logger.error(f"Error syncing activities for user {user_data['telegram_id']}: {e}")
+        logger.error(f"Error syncing activities for user {user.telegram_id}: {e}")
 
-async def refresh_all_weighted_distances(telegram_id: int):
+async def refresh_all_weighted_distances(telegram_id: int, weights: dict, challenges: list):
     """
-    Refresh all weighted_distance values in the DB for a specific user.
+    Refresh all weighted_distance values in the DB for a specific user,
+    including their per-challenge scores.
+
+    Skipped if the weights and challenges are the same as on the last run
+    for the user (all scores written since then used them already).
     """
+    fingerprint = scoring_fingerprint(weights, challenges)
+    if _reconciled.get(telegram_id) == fingerprint:
+        return
     try:
-        # Fetch weights
-        weights = await refresh_activity_weights()
-        
         # Fetch user activities
-        res = supabase.table("activities").select("*").eq("user_id", telegram_id).execute()
-        if not res.data:
+        activities = await asyncio.to_thread(get_activity_scores, telegram_id)
+        if not activities:
+            _reconciled[telegram_id] = fingerprint
             return
             
         updates = []
-        for activity in res.data:
-            dist_meters = float(activity["distance"]) * 1000.0
-            new_weighted = calculate_weighted_distance(activity["type"], dist_meters, custom_weights=weights)
+        for activity in activities:
+            dist_meters = activity.distance * 1000.0
+            new_weighted = calculate_weighted_distance(activity.type, dist_meters, custom_weights=weights)
             
-            if abs(new_weighted - float(activity["weighted_distance"])) > 0.001:
+            if abs(new_weighted - activity.weighted_distance) > 0.001:
                 updates.append({
-                    "activity_id": activity["activity_id"],
+                    "activity_id": activity.activity_id,
                     "weighted_distance": new_weighted
                 })
         
         if updates:
             # Upsert acts as "update" when activity_id matches
-            supabase.table("activities").upsert(updates).execute()
+            write_buffer.upsert("activities", updates)
             logger.info(f"Updated weights for {len(updates)} existing activities for user {telegram_id}")
+
+        await refresh_challenge_scores(telegram_id, activities, challenges)
+        _reconciled[telegram_id] = fingerprint
             
     except Exception as e:
         logger.warn(f"Failed to refresh all weighted distances for {telegram_id}: {e}")
 
+async def refresh_challenge_scores(telegram_id: int, activities: list, challenges: list):
+    """
+    Brings the user's stored challenge scores in line with their activities,
+    challenge weights and memberships.
+    """
+    expected = {}
+    for activity in activities:
+        row = {
+            "activity_id": activity.activity_id,
+            "user_id": telegram_id,
+            "type": activity.type,
+            "distance": activity.distance,
+            "start_date": activity.start_date,
+        }
+        for score in score_for_challenges(row, challenges):
+            expected[(score["challenge_id"], score["activity_id"])] = score
+
+    stored = await asyncio.to_thread(get_challenge_scores, telegram_id)
+
+    changed = [
+        score for key, score in expected.items()
+        if key not in stored or abs(stored[key] - score["weighted_distance"]) > 0.001
+    ]
+    if changed:
+        write_buffer.upsert("challenge_activities", changed)
+
+    # Only scores of activities in the snapshot can be judged: activities
+    # written after it was taken may already have scores. Scores of deleted
+    # activities are removed by the database ('on delete cascade').
+    snapshot_ids = {activity.activity_id for activity in activities}
+    stale: dict[int, list[int]] = {}
+    for challenge_id, activity_id in stored.keys() - expected.keys():
+        if activity_id in snapshot_ids:
+            stale.setdefault(challenge_id, []).append(activity_id)
+    for challenge_id, activity_ids in stale.items():
+        await asyncio.to_thread(
+            supabase.table("challenge_activities").delete().eq("challenge_id", challenge_id).in_(
+                "activity_id", activity_ids
+            ).execute
+        )
+    if stale:
+        bump_activity_data_version()
+
+async def get_latest_activity_date(telegram_id: int) -> datetime | None:
+    """
+    Returns the start date of the user's most recent stored Strava activity.
+    Photo submissions (negative IDs) are ignored, they say nothing about
+    what has been synced from Strava.
+    """
+    res = await asyncio.to_thread(
+        supabase.table("activities")
+        .select("start_date")
+        .eq("user_id", telegram_id)
+        .gt("activity_id", 0)
+        .order("start_date", desc=True)
+        .limit(1)
+        .execute
+    )
+    if not res.data:
+        return None
+    # Stored without timezone, compare against the naive sync dates
+    return datetime.fromisoformat(res.data[0]["start_date"]).replace(tzinfo=None)
+
+async def sync_user_incremental(user: UserTokens):
+    """
+    Syncs only activities newer than the latest one already stored for the user,
+    minus a lookback period. The overlap picks up activities uploaded late
+    (e.g. a watch synced days later) whose webhook was missed; re-fetched
+    activities that are stored unchanged are not written again.
+    """
+    try:
+        latest = await get_latest_activity_date(user.telegram_id)
+    except Exception as e:
+        logger.error(f"Error fetching latest activity for {user.telegram_id}: {e}")
+        return
+    if latest is not None:
+        latest -= timedelta(days=settings.SYNC_LOOKBACK_DAYS)
+    await sync_user_activities(user, after=latest)
+
 async def sync_for_user(telegram_id: int):
     """
     Fetches user data from DB and runs sync.
     """
     try:
-        res = supabase.table("users").select("*").eq("telegram_id", telegram_id).execute()
-        if res.data:
-            user_data = res.data[0]
-            if user_data.get("access_token"):
-                await sync_user_activities(user_data)
+        user = await asyncio.to_thread(get_user_tokens, telegram_id)
+        if user and user.access_token:
+            await sync_user_activities(user)
+            # Callers read the activities right after syncing
+            await write_buffer.flush()
     except Exception as e:
         logger.error(f"Error in sync_for_user for {telegram_id}: {e}")
 
@@ -127,8 +285,8 @@ async def sync_all_users():
     Syncs activities for all users that have a Strava connection.
     """
     try:
-        res = supabase.table("users").select("*").not_.is_("access_token", "null").execute()
-        for user_data in res.data:
-            await sync_user_activities(user_data)
+        for user in await asyncio.to_thread(get_connected_users):
+            await sync_user_activities(user)
+        await write_buffer.flush()
     except Exception as e:
         logger.error(f"Error in sync_all_users: {e}")
@@ -0,0 +1,41 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from core.config import settings
+
+# Process pool for CPU-heavy work (OCR, chart rendering), created on first use
+_executor: ProcessPoolExecutor | None = None
+_slots: asyncio.Semaphore | None = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor, _slots
+    if _executor is None:
+        # Workers are started from a clean server process instead of forking
+        # the app, whose threads (uvicorn, telegram, to_thread) could deadlock them
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.WORKER_PROCESSES,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+        # Bound the number of queued jobs so bursts wait instead of piling up
+        _slots = asyncio.Semaphore(settings.WORKER_PROCESSES * 2)
+    return _executor
+
+
+async def run_in_process(fn, *args):
+    """
+    Runs fn(*args) in the worker process pool without blocking the event loop.
+    'fn' must be a module-level function and its arguments picklable.
+    """
+    executor = _get_executor()
+    async with _slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, fn, *args)
+
+
+def shutdown_workers():
+    global _executor, _slots
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _slots = None
@@ -0,0 +1,51 @@
+"""
+Measures the cold import time of the application entry point.
+
+Each run imports the module in a fresh interpreter without any environment
+variables, so it also checks that importing does not need live credentials.
+
+Usage:
+    python benchmarks/startup.py [module] [--runs N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def time_import(module: str) -> float:
+    env = {"PATH": os.environ.get("PATH", ""), "PYTHONPATH": str(ROOT)}
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", f"import {module}"],
+        cwd=ROOT,
+        env=env,
+        check=True,
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("module", nargs="?", default="app.main")
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    # Baseline: an interpreter that imports nothing
+    baseline = statistics.median(time_import("sys") for _ in range(args.runs))
+    timings = [time_import(args.module) for _ in range(args.runs)]
+
+    print(f"import {args.module} ({args.runs} runs)")
+    print(f"  median: {statistics.median(timings) * 1000:.1f} ms")
+    print(f"  min:    {min(timings) * 1000:.1f} ms")
+    print(f"  max:    {max(timings) * 1000:.1f} ms")
+    print(f"  interpreter baseline: {baseline * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from core.config import settings
+from core.scoring import calculate_weighted_distance, refresh_activity_weights
+from db.models import Challenge, to_naive_utc
+from db.queries import get_challenges as load_challenges
+
+# Challenges change rarely, so they are reloaded at most this often
+CACHE_SECONDS = 60
+
+_cache: list[Challenge] | None = None
+_cache_loaded_at = 0.0
+
+
+async def get_challenges() -> list[Challenge]:
+    """
+    Returns all challenges. Challenges without their own weights use the
+    global activity weights.
+    """
+    global _cache, _cache_loaded_at
+    if _cache is None or time.monotonic() - _cache_loaded_at > CACHE_SECONDS:
+        challenges = await asyncio.to_thread(load_challenges)
+        if any(not c.weights for c in challenges):
+            global_weights = await refresh_activity_weights()
+            for challenge in challenges:
+                if not challenge.weights:
+                    challenge.weights = dict(global_weights)
+        _cache = challenges
+        _cache_loaded_at = time.monotonic()
+    return _cache
+
+
+async def get_user_challenges(telegram_id: int) -> list[Challenge]:
+    return [c for c in await get_challenges() if telegram_id in c.members]
+
+
+async def get_chat_challenge(chat_id: int) -> Challenge | None:
+    """Returns the most recently started challenge of a group chat."""
+    matching = [c for c in await get_challenges() if c.chat_id == chat_id]
+    return max(matching, key=lambda c: c.start_date, default=None)
+
+
+def pick_current(challenges: list[Challenge]) -> Challenge | None:
+    """Prefers a running challenge, otherwise the most recently started one."""
+    now = to_naive_utc(datetime.now(timezone.utc))
+    running = [c for c in challenges if c.contains(now)]
+    return max(running or challenges, key=lambda c: c.start_date, default=None)
+
+
+def get_sync_window(challenges: list[Challenge] = ()) -> tuple[datetime | None, datetime | None]:
+    """
+    Returns the (start, end) dates to fetch from Strava. Either may be None.
+
+    With challenges, this is the union of their windows, so a user's activities
+    are fetched once for all of them. Otherwise the configured sync dates apply.
+    """
+    if challenges:
+        start_date = min(c.start_date for c in challenges)
+        ends = [c.end_date for c in challenges]
+        end_date = None if None in ends else max(ends)
+        return start_date, end_date
+
+    start_date = None
+    if settings.STRAVA_SYNC_START_DATE:
+        start_date = datetime.strptime(settings.STRAVA_SYNC_START_DATE, "%Y-%m-%d")
+    end_date = None
+    if settings.STRAVA_SYNC_END_DATE:
+        end_date = datetime.strptime(settings.STRAVA_SYNC_END_DATE, "%Y-%m-%d")
+    return start_date, end_date
+
+
+def score_for_challenges(row: dict, challenges: list[Challenge]) -> list[dict]:
+    """
+    Returns the 'challenge_activities' rows of an activity row: one per
+    challenge whose window contains it and whose weights allow its type.
+    """
+    start_date = to_naive_utc(row["start_date"])
+    scores = []
+    for challenge in challenges:
+        if row["user_id"] not in challenge.members or not challenge.contains(start_date):
+            continue
+        weighted_km = calculate_weighted_distance(
+            row["type"], row["distance"] * 1000.0, custom_weights=challenge.weights
+        )
+        if weighted_km > 0:
+            scores.append({
+                "challenge_id": challenge.id,
+                "activity_id": row["activity_id"],
+                "user_id": row["user_id"],
+                "weighted_distance": weighted_km,
+                "start_date": start_date.isoformat(),
+            })
+    return scores
+
+
+def attribute_activities(rows: list[dict], challenges: list[Challenge]) -> tuple[list[dict], list[dict]]:
+    """
+    Splits activity rows into the rows to store and their challenge scores.
+
+    An activity is stored if the global weights allow it or it counts for at
+    least one challenge.
+    """
+    kept, scores = [], []
+    for row in rows:
+        row_scores = score_for_challenges(row, challenges)
+        if row["weighted_distance"] > 0 or row_scores:
+            kept.append(row)
+            scores.extend(row_scores)
+    return kept, scores
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -18,13 +19,46 @@ class Settings(BaseSettings):
     # Webhook
     # The token you define for Strava to verify the webhook
     WEBHOOK_VERIFY_TOKEN: str = "STRAVA_DEFAULT_TOKEN"
+    # Deduplication of retried webhook deliveries
+    WEBHOOK_DEDUP_CACHE_SIZE: int = 10000
+    WEBHOOK_DEDUP_RETENTION_DAYS: int = 7
     
     # Sync Configuration
     # Format: YYYY-MM-DD
     STRAVA_SYNC_START_DATE: str | None = None
     STRAVA_SYNC_END_DATE: str | None = None
 
+    # Background Sync
+    # Every connected user is reconciled once per interval. Users whose data
+    # arrived via webhook within the freshness window are skipped.
+    SYNC_SCHEDULER_ENABLED: bool = True
+    SYNC_INTERVAL_MINUTES: int = 60
+    SYNC_FRESHNESS_MINUTES: int = 30
+    # Incremental syncs re-fetch this many days before the latest stored
+    # activity, to catch late uploads whose webhook was missed
+    SYNC_LOOKBACK_DAYS: int = 7
+
+    # Backfill of newly connected users
+    # Activities are fetched and stored page by page, with a progress
+    # message to the user every BACKFILL_PROGRESS_EVERY activities.
+    BACKFILL_PAGE_SIZE: int = 100
+    BACKFILL_PROGRESS_EVERY: int = 100
+
+    # Worker processes for CPU-heavy work (photo OCR, chart rendering)
+    WORKER_PROCESSES: int = 2
+
     class Config:
         env_file = ".env"
 
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    """Loads the settings on first use (not at import time)."""
+    return Settings()
+
+class _LazySettings:
+    """Forwards attribute access to get_settings(), so importing is free."""
+
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
+
+settings: Settings = _LazySettings()
@@ -1,3 +1,4 @@
+import asyncio
 from decimal import Decimal
 from typing import Dict, Optional
 
@@ -40,7 +41,9 @@ async def refresh_activity_weights() -> Dict[str, Decimal]:
     """
     from db.supabase import supabase
     try:
-        res = supabase.table("activity_weights").select("sport_type, weight").execute()
+        res = await asyncio.to_thread(
+            supabase.table("activity_weights").select("sport_type, weight").execute
+        )
         if res.data:
             return {item["sport_type"]: Decimal(str(item["weight"])) for item in res.data}
     except Exception as e:
@@ -0,0 +1,64 @@
+import asyncio
+import time
+from db.models import UserTokens
+from db.queries import get_user_by_athlete
+
+
+class AthleteCache:
+    """
+    In-memory map of Strava athlete_id -> user credentials.
+
+    Unknown athletes are cached as None for 'negative_ttl' seconds, so events of
+    athletes that never registered do not hit the DB every time. Entries are kept
+    in sync through put() (OAuth) and update_tokens() (token refresh).
+    """
+
+    def __init__(self, negative_ttl: float = 600):
+        self.negative_ttl = negative_ttl
+        self._users: dict[int, UserTokens] = {}
+        self._unknown: dict[int, float] = {}  # athlete_id -> expiry (monotonic)
+        self._athlete_ids: dict[int, int] = {}  # telegram_id -> athlete_id
+
+    async def get(self, athlete_id: int) -> UserTokens | None:
+        """
+        Returns the user linked to the athlete, loading it from the DB (off the
+        event loop) on a miss.
+        """
+        user = self._users.get(athlete_id)
+        if user is not None:
+            return user
+
+        expiry = self._unknown.get(athlete_id)
+        if expiry is not None:
+            if time.monotonic() < expiry:
+                return None
+            del self._unknown[athlete_id]
+
+        user = await asyncio.to_thread(get_user_by_athlete, athlete_id)
+        if user is None:
+            self._unknown[athlete_id] = time.monotonic() + self.negative_ttl
+        else:
+            self.put(athlete_id, user)
+        return user
+
+    def put(self, athlete_id: int, user: UserTokens):
+        """Links the athlete to the user, replacing any previous link of either."""
+        previous_athlete = self._athlete_ids.get(user.telegram_id)
+        if previous_athlete is not None and previous_athlete != athlete_id:
+            self._users.pop(previous_athlete, None)
+        self._unknown.pop(athlete_id, None)
+        self._users[athlete_id] = user
+        self._athlete_ids[user.telegram_id] = athlete_id
+
+    def update_tokens(self, user: UserTokens):
+        """Copies refreshed tokens into the cached entry of the user, if any."""
+        athlete_id = self._athlete_ids.get(user.telegram_id)
+        cached = self._users.get(athlete_id) if athlete_id is not None else None
+        if cached is None or cached is user:
+            return
+        cached.access_token = user.access_token
+        cached.refresh_token = user.refresh_token
+        cached.expires_at = user.expires_at
+
+
+athlete_cache = AthleteCache()
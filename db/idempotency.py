@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from core.config import settings
+from db.supabase import supabase
+
+logger = logging.getLogger(__name__)
+
+# (subscription_id, object_id, aspect_type, event_time)
+EventKey = tuple[int, int, str, int]
+
+# Old keys are deleted from the table at most this often
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+class WebhookEventStore:
+    """
+    Idempotency keys of processed Strava webhook deliveries.
+
+    Recent keys are kept in an in-memory LRU, so retries are recognized without
+    a DB round trip. The 'webhook_events' table backs it across restarts; rows
+    older than the retention period are pruned. DB calls run off the event loop.
+    """
+
+    def __init__(self):
+        self._seen: OrderedDict[EventKey, None] = OrderedDict()
+        self._last_pruned = 0.0
+
+    async def claim(self, key: EventKey) -> bool:
+        """
+        Marks the delivery as being processed.
+        Returns False if it was already claimed before (a duplicate).
+        """
+        if key in self._seen:
+            self._seen.move_to_end(key)
+            return False
+        self._remember(key)
+
+        subscription_id, object_id, aspect_type, event_time = key
+        try:
+            res = await asyncio.to_thread(
+                supabase.table("webhook_events").upsert(
+                    {
+                        "subscription_id": subscription_id,
+                        "object_id": object_id,
+                        "aspect_type": aspect_type,
+                        "event_time": event_time,
+                    },
+                    on_conflict="subscription_id,object_id,aspect_type,event_time",
+                    ignore_duplicates=True,
+                ).execute
+            )
+            # Nothing inserted: the key was stored before the last restart
+            if not res.data:
+                return False
+        except Exception as e:
+            # Better to risk a duplicate than to drop the event
+            logger.warning(f"Failed to store webhook idempotency key {key}: {e}")
+
+        await self._prune()
+        return True
+
+    async def release(self, key: EventKey):
+        """Forgets a claimed delivery whose processing failed, so a retry is processed."""
+        self._seen.pop(key, None)
+        subscription_id, object_id, aspect_type, event_time = key
+        try:
+            await asyncio.to_thread(
+                supabase.table("webhook_events")
+                .delete()
+                .eq("subscription_id", subscription_id)
+                .eq("object_id", object_id)
+                .eq("aspect_type", aspect_type)
+                .eq("event_time", event_time)
+                .execute
+            )
+        except Exception as e:
+            logger.warning(f"Failed to release webhook idempotency key {key}: {e}")
+
+    def _remember(self, key: EventKey):
+        self._seen[key] = None
+        while len(self._seen) > settings.WEBHOOK_DEDUP_CACHE_SIZE:
+            self._seen.popitem(last=False)
+
+    async def _prune(self):
+        if time.monotonic() - self._last_pruned < PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_pruned = time.monotonic()
+        cutoff = datetime.now(timezone.utc) - timedelta(days=settings.WEBHOOK_DEDUP_RETENTION_DAYS)
+        try:
+            await asyncio.to_thread(
+                supabase.table("webhook_events").delete().lt("received_at", cutoff.isoformat()).execute
+            )
+        except Exception as e:
+            logger.warning(f"Failed to prune webhook idempotency keys: {e}")
+
+
+webhook_events = WebhookEventStore()
@@ -0,0 +1,88 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import ClassVar
+
+
+def to_naive_utc(value: datetime | str) -> datetime:
+    """Parses/normalizes a timestamp to a naive UTC datetime, as stored in the DB."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@dataclass(slots=True)
+class UserTokens:
+    """The Strava credentials of a user, as needed to build a client."""
+
+    COLUMNS: ClassVar[str] = "telegram_id, access_token, refresh_token, expires_at"
+
+    telegram_id: int
+    access_token: str | None
+    refresh_token: str | None
+    expires_at: int | None
+
+    @classmethod
+    def from_row(cls, row: dict) -> "UserTokens":
+        return cls(
+            telegram_id=row["telegram_id"],
+            access_token=row.get("access_token"),
+            refresh_token=row.get("refresh_token"),
+            expires_at=row.get("expires_at"),
+        )
+
+
+@dataclass(slots=True)
+class ActivityScore:
+    """The scoring-relevant fields of a stored activity."""
+
+    COLUMNS: ClassVar[str] = "activity_id, type, distance, weighted_distance, start_date"
+
+    activity_id: int
+    type: str
+    distance: float
+    weighted_distance: float
+    start_date: datetime
+
+    @classmethod
+    def from_row(cls, row: dict) -> "ActivityScore":
+        return cls(
+            activity_id=row["activity_id"],
+            type=row["type"],
+            distance=float(row["distance"]),
+            weighted_distance=float(row["weighted_distance"]),
+            start_date=to_naive_utc(row["start_date"]),
+        )
+
+
+@dataclass(slots=True)
+class Challenge:
+    """A challenge with its own date window, group chat, members and weights."""
+
+    COLUMNS: ClassVar[str] = "id, name, chat_id, start_date, end_date"
+
+    id: int
+    name: str
+    chat_id: int | None
+    start_date: datetime
+    end_date: datetime | None
+    members: frozenset[int] = frozenset()
+    weights: dict[str, Decimal] = field(default_factory=dict)
+
+    @classmethod
+    def from_row(cls, row: dict) -> "Challenge":
+        return cls(
+            id=row["id"],
+            name=row["name"],
+            chat_id=row.get("chat_id"),
+            start_date=to_naive_utc(row["start_date"]),
+            end_date=to_naive_utc(row["end_date"]) if row.get("end_date") else None,
+        )
+
+    def contains(self, when: datetime) -> bool:
+        """Whether a (naive UTC) start date falls into the challenge window."""
+        if when < self.start_date:
+            return False
+        return self.end_date is None or when < self.end_date
@@ -0,0 +1,136 @@
+from datetime import datetime
+from decimal import Decimal
+from db.models import ActivityScore, Challenge, UserTokens
+from db.supabase import supabase
+
+
+def get_user_tokens(telegram_id: int) -> UserTokens | None:
+    """Returns the Strava credentials of a user, or None if the user is unknown."""
+    res = (
+        supabase.table("users")
+        .select(UserTokens.COLUMNS)
+        .eq("telegram_id", telegram_id)
+        .execute()
+    )
+    return UserTokens.from_row(res.data[0]) if res.data else None
+
+
+def get_user_by_athlete(athlete_id: int) -> UserTokens | None:
+    """Returns the Strava credentials of the user linked to a Strava athlete."""
+    res = (
+        supabase.table("users")
+        .select(UserTokens.COLUMNS)
+        .eq("athlete_id", athlete_id)
+        .execute()
+    )
+    return UserTokens.from_row(res.data[0]) if res.data else None
+
+
+def get_connected_users() -> list[UserTokens]:
+    """Returns the credentials of all users that connected their Strava account."""
+    res = (
+        supabase.table("users")
+        .select(UserTokens.COLUMNS)
+        .not_.is_("access_token", "null")
+        .execute()
+    )
+    return [UserTokens.from_row(row) for row in res.data]
+
+
+def get_display_names(telegram_ids: list[int]) -> dict[int, str]:
+    """Returns the display names of the given users, keyed by telegram_id."""
+    res = (
+        supabase.table("users")
+        .select("telegram_id, first_name, last_name, telegram_username")
+        .in_("telegram_id", telegram_ids)
+        .execute()
+    )
+    names = {}
+    for u in res.data:
+        # Logic: first + last > telegram_username > ID
+        display_name = f"{u.get('first_name') or ''} {u.get('last_name') or ''}".strip()
+        if not display_name:
+            if u.get("telegram_username"):
+                display_name = f"@{u['telegram_username']}"
+            else:
+                display_name = f"User {u['telegram_id']}"
+        names[u["telegram_id"]] = display_name
+    return names
+
+
+def get_activity_scores(telegram_id: int) -> list[ActivityScore]:
+    """Returns the scoring fields of all stored activities of a user."""
+    res = (
+        supabase.table("activities")
+        .select(ActivityScore.COLUMNS)
+        .eq("user_id", telegram_id)
+        .execute()
+    )
+    return [ActivityScore.from_row(row) for row in res.data]
+
+
+def get_stored_activities(telegram_id: int, since: datetime | None = None) -> dict[int, dict]:
+    """
+    Returns the stored activity rows of a user started at or after 'since',
+    keyed by activity_id.
+    """
+    query = (
+        supabase.table("activities")
+        .select("activity_id, type, distance, weighted_distance, name, start_date")
+        .eq("user_id", telegram_id)
+    )
+    if since is not None:
+        query = query.gte("start_date", since.isoformat())
+    return {row["activity_id"]: row for row in query.execute().data}
+
+
+def get_challenge_scores(telegram_id: int, since: datetime | None = None) -> dict[tuple[int, int], float]:
+    """
+    Returns the stored challenge scores of a user's activities started at or
+    after 'since', keyed by (challenge_id, activity_id).
+    """
+    query = (
+        supabase.table("challenge_activities")
+        .select("challenge_id, activity_id, weighted_distance")
+        .eq("user_id", telegram_id)
+    )
+    if since is not None:
+        query = query.gte("start_date", since.isoformat())
+    return {
+        (row["challenge_id"], row["activity_id"]): float(row["weighted_distance"])
+        for row in query.execute().data
+    }
+
+
+def update_user_tokens(user: UserTokens):
+    """Persists refreshed Strava tokens of a user."""
+    supabase.table("users").update({
+        "access_token": user.access_token,
+        "refresh_token": user.refresh_token,
+        "expires_at": user.expires_at,
+    }).eq("telegram_id", user.telegram_id).execute()
+
+
+def get_challenges() -> list[Challenge]:
+    """Returns all challenges with their members and weights."""
+    challenges = {
+        row["id"]: Challenge.from_row(row)
+        for row in supabase.table("challenges").select(Challenge.COLUMNS).execute().data
+    }
+    if not challenges:
+        return []
+
+    members: dict[int, set[int]] = {}
+    res = supabase.table("challenge_members").select("challenge_id, telegram_id").execute()
+    for row in res.data:
+        members.setdefault(row["challenge_id"], set()).add(row["telegram_id"])
+
+    res = supabase.table("challenge_weights").select("challenge_id, sport_type, weight").execute()
+    for row in res.data:
+        challenge = challenges.get(row["challenge_id"])
+        if challenge is not None:
+            challenge.weights[row["sport_type"]] = Decimal(str(row["weight"]))
+
+    for challenge_id, challenge in challenges.items():
+        challenge.members = frozenset(members.get(challenge_id, ()))
+    return list(challenges.values())
@@ -34,4 +34,58 @@ create table activity_weights (
   sport_type text primary key,
   weight decimal not null,
   icon text
-);
\ No newline at end of file
+);
+
+-- Backfill jobs for newly connected users
+-- cursor_date is the start date of the last stored activity, so an
+-- interrupted backfill resumes from there
+create table backfill_jobs (
+  telegram_id bigint primary key references users(telegram_id),
+  cursor_date timestamp,
+  synced_count integer default 0,
+  status text default 'running',
+  updated_at timestamp with time zone default now()
+);
+
+-- Challenges, each with its own date window and (group) chat
+create table challenges (
+  id bigint generated always as identity primary key,
+  name text not null,
+  chat_id bigint,
+  start_date timestamp not null,
+  end_date timestamp
+);
+-- Members of a challenge
+create table challenge_members (
+  challenge_id bigint references challenges(id) on delete cascade,
+  telegram_id bigint references users(telegram_id),
+  primary key (challenge_id, telegram_id)
+);
+-- Per-challenge activity weights (challenges without rows use activity_weights)
+create table challenge_weights (
+  challenge_id bigint references challenges(id) on delete cascade,
+  sport_type text,
+  weight decimal not null,
+  primary key (challenge_id, sport_type)
+);
+-- Scores of activities per challenge, the source of per-challenge leaderboards
+create table challenge_activities (
+  challenge_id bigint references challenges(id) on delete cascade,
+  activity_id bigint references activities(activity_id) on delete cascade,
+  user_id bigint references users(telegram_id),
+  weighted_distance float,
+  start_date timestamp,
+  primary key (challenge_id, activity_id)
+);
+create index challenge_activities_user_idx on challenge_activities (challenge_id, user_id);
+
+-- Processed Strava webhook deliveries, used to ignore retried deliveries
+create table webhook_events (
+  subscription_id bigint,
+  object_id bigint,
+  aspect_type text,
+  event_time bigint,
+  received_at timestamp with time zone default now(),
+  primary key (subscription_id, object_id, aspect_type, event_time)
+);
+create index webhook_events_received_at_idx on webhook_events (received_at);
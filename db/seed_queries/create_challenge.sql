@@ -0,0 +1,16 @@
+-- Example: create a challenge for a family group chat with its own weights
+-- 1. Create the challenge (chat_id is the Telegram group chat ID)
+INSERT INTO challenges (name, chat_id, start_date, end_date)
+VALUES ('Summer 2025', -1001234567890, '2025-06-01', '2025-09-01');
+-- 2. Add members
+INSERT INTO challenge_members (challenge_id, telegram_id)
+SELECT c.id, u.telegram_id
+FROM challenges c, users u
+WHERE c.name = 'Summer 2025'
+    AND u.is_verified;
+-- 3. Optionally: challenge-specific weights (otherwise activity_weights apply)
+INSERT INTO challenge_weights (challenge_id, sport_type, weight)
+SELECT id, w.sport_type, w.weight
+FROM challenges,
+    (VALUES ('Run', 1.0), ('Ride', 0.25), ('Swim', 4.0)) AS w(sport_type, weight)
+WHERE name = 'Summer 2025';
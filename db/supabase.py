@@ -1,7 +1,26 @@
-from supabase import create_client, Client
+from typing import TYPE_CHECKING
 from core.config import settings
 
-def create_supabase_client() -> Client:
+if TYPE_CHECKING:
+    from supabase import Client
+
+_client: "Client | None" = None
+
+def create_supabase_client() -> "Client":
+    from supabase import create_client
     return create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
 
-supabase: Client = create_supabase_client()
+def get_supabase() -> "Client":
+    """Returns the shared Supabase client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = create_supabase_client()
+    return _client
+
+class _LazyClient:
+    """Forwards attribute access to get_supabase(), so importing is free."""
+
+    def __getattr__(self, name):
+        return getattr(get_supabase(), name)
+
+supabase: "Client" = _LazyClient()
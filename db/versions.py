@@ -0,0 +1,14 @@
+# In-process version of the activity data. Every write to 'activities' or
+# 'challenge_activities' bumps it (syncs skip rows that are stored unchanged,
+# so a re-sync without new data keeps the version), so caches derived from that data (e.g.
+# rendered charts) can tell whether they are stale without querying the DB.
+_activity_data_version = 0
+
+
+def activity_data_version() -> int:
+    return _activity_data_version
+
+
+def bump_activity_data_version():
+    global _activity_data_version
+    _activity_data_version += 1
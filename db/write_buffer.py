@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from db.supabase import supabase
+from db.versions import bump_activity_data_version
+
+logger = logging.getLogger(__name__)
+
+# Primary key columns of each table that can be written through the buffer
+PRIMARY_KEYS = {
+    "activities": ("activity_id",),
+    "users": ("telegram_id",),
+    "challenge_activities": ("challenge_id", "activity_id"),
+}
+
+# Max rows sent in a single upsert request
+MAX_BATCH_SIZE = 500
+
+# Upper bound of the backoff between retries of failed writes (seconds)
+MAX_RETRY_DELAY = 60.0
+
+# Flush attempts on shutdown before unwritten rows are given up
+SHUTDOWN_FLUSH_ATTEMPTS = 3
+
+
+class WriteBuffer:
+    """
+    Write-behind buffer for upserts.
+
+    Rows are collected for 'window' seconds, merged by primary key (later
+    values win) and then sent as one bulk upsert per table. Because rows are
+    merged, a partial row (e.g. only 'telegram_username') can be buffered next
+    to a full row of the same key. Failed writes stay in the buffer and are
+    retried, so rows are never silently dropped.
+    """
+
+    def __init__(self, window: float = 0.5):
+        self.window = window
+        self._pending: dict[str, dict[tuple, dict]] = {table: {} for table in PRIMARY_KEYS}
+        self._flush_task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+        # Consecutive flushes with failed writes, drives the retry backoff
+        self._failures = 0
+
+    def upsert(self, table: str, rows: dict | list[dict]):
+        """Queues rows for upsert. Must be called from within the event loop."""
+        if isinstance(rows, dict):
+            rows = [rows]
+        key_columns = PRIMARY_KEYS[table]
+        pending = self._pending[table]
+        for row in rows:
+            key = tuple(row[column] for column in key_columns)
+            pending.setdefault(key, {}).update(row)
+
+        self._schedule_flush(self.window)
+
+    def _schedule_flush(self, delay: float):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        # Only the sleeping timer may be cancelled (by close()): once flushing,
+        # cancelling would lose the batch taken out of the buffer. Rows queued
+        # from now on schedule a new timer.
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        """
+        Sends all pending rows now. Rows that fail to be written are put back
+        and retried with exponential backoff.
+        """
+        async with self._lock:
+            failed = False
+            for table, pending in self._pending.items():
+                if not pending:
+                    continue
+                rows = list(pending.values())
+                pending.clear()
+                # Supabase calls block, so run them off the event loop
+                unsent = await asyncio.to_thread(self._write, table, rows)
+                if len(unsent) < len(rows) and table in ("activities", "challenge_activities"):
+                    bump_activity_data_version()
+                if unsent:
+                    failed = True
+                    self._requeue(table, unsent)
+
+            if failed:
+                self._failures += 1
+                delay = min(self.window * 2 ** self._failures, MAX_RETRY_DELAY)
+                logger.warning(f"Retrying failed writes in {delay:.1f}s (attempt {self._failures})")
+                self._schedule_flush(delay)
+            else:
+                self._failures = 0
+
+    def _requeue(self, table: str, rows: list[dict]):
+        # Rows queued since the failed attempt are newer and take precedence
+        key_columns = PRIMARY_KEYS[table]
+        pending = self._pending[table]
+        for row in rows:
+            key = tuple(row[column] for column in key_columns)
+            pending[key] = {**row, **pending.get(key, {})}
+
+    def _write(self, table: str, rows: list[dict]) -> list[dict]:
+        """Upserts the rows and returns those that could not be written."""
+        # PostgREST requires all rows of a bulk upsert to have the same columns
+        groups: dict[tuple, list[dict]] = {}
+        for row in rows:
+            groups.setdefault(tuple(sorted(row)), []).append(row)
+
+        unsent = []
+        for group in groups.values():
+            for i in range(0, len(group), MAX_BATCH_SIZE):
+                batch = group[i:i + MAX_BATCH_SIZE]
+                try:
+                    supabase.table(table).upsert(batch).execute()
+                except Exception as e:
+                    logger.error(f"Failed to write {len(batch)} rows to {table}: {e}")
+                    unsent.extend(batch)
+        return unsent
+
+    def pending_count(self) -> int:
+        return sum(len(pending) for pending in self._pending.values())
+
+    async def close(self):
+        """
+        Cancels the pending timer and flushes everything (on shutdown),
+        retrying a few times before giving up. A flush already in progress is
+        waited for, as flushes are serialized.
+        """
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        for attempt in range(SHUTDOWN_FLUSH_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(self.window * 2 ** attempt)
+            await self.flush()
+            if not self.pending_count():
+                break
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        if self.pending_count():
+            logger.error(f"Shutting down with {self.pending_count()} unwritten rows, they are lost.")
+
+
+write_buffer = WriteBuffer()
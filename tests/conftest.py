@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+# Settings are loaded lazily; give the required ones dummy values so modules
+# using them can be exercised without a .env file
+for name in (
+    "TELEGRAM_BOT_TOKEN",
+    "SUPABASE_URL",
+    "SUPABASE_KEY",
+    "STRAVA_CLIENT_ID",
+    "STRAVA_CLIENT_SECRET",
+):
+    os.environ.setdefault(name, "test")
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    """Records a chained Supabase query and hands it to FakeSupabase on execute()."""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.op = None
+        self.payload = None
+        self.kwargs = {}
+        self.filters = []
+
+    def upsert(self, payload, **kwargs):
+        self.op, self.payload, self.kwargs = "upsert", payload, kwargs
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(("in", column, list(values)))
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(("eq", column, value))
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(("lt", column, value))
+        return self
+
+    def execute(self):
+        return self.db.execute(self)
+
+
+class FakeSupabase:
+    """
+    Minimal stand-in for the Supabase client.
+
+    'fail' makes the next n queries raise, 'respond' may override the
+    returned data (by default upserts return their payload).
+    """
+
+    def __init__(self):
+        self.queries: list[FakeQuery] = []
+        self.fail = 0
+        self.respond = None
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def execute(self, query):
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("database unavailable")
+        self.queries.append(query)
+        if self.respond is not None:
+            return FakeResponse(self.respond(query))
+        payload = query.payload
+        return FakeResponse(payload if isinstance(payload, list) else [payload] if payload else [])
+
+    def upserts(self, table):
+        return [q.payload for q in self.queries if q.table == table and q.op == "upsert"]
+
+
+@pytest.fixture
+def fake_db(request, monkeypatch):
+    """
+    A FakeSupabase installed as the 'supabase' client of the modules named by
+    the test's 'supabase' marker, e.g. pytestmark = pytest.mark.supabase(db.idempotency).
+    """
+    marker = request.node.get_closest_marker("supabase")
+    if marker is None or not marker.args:
+        raise pytest.UsageError("fake_db needs a 'supabase' marker naming the modules to patch")
+    fake = FakeSupabase()
+    for module in marker.args:
+        monkeypatch.setattr(module, "supabase", fake)
+    return fake
+
+
+@pytest.fixture
+def settings_env(monkeypatch):
+    """Sets environment overrides and reloads the settings."""
+    from core.config import get_settings
+
+    def apply(**values):
+        for name, value in values.items():
+            monkeypatch.setenv(name, str(value))
+        get_settings.cache_clear()
+
+    yield apply
+    get_settings.cache_clear()
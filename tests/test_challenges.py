@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from core.challenges import attribute_activities, get_sync_window, pick_current, score_for_challenges
+from db.models import Challenge
+
+OCT_1 = datetime(2026, 10, 1)
+NOV_1 = datetime(2026, 11, 1)
+
+
+def challenge(id, start=OCT_1, end=NOV_1, members=(7,), **weights):
+    return Challenge(
+        id=id,
+        name=f"Challenge {id}",
+        chat_id=None,
+        start_date=start,
+        end_date=end,
+        members=frozenset(members),
+        weights={sport: Decimal(str(w)) for sport, w in (weights or {"Run": 1}).items()},
+    )
+
+
+def activity(activity_id=1, type="Run", distance=5.0, start_date="2026-10-10T08:00:00", weighted=5.0):
+    return {
+        "activity_id": activity_id,
+        "user_id": 7,
+        "type": type,
+        "distance": distance,
+        "weighted_distance": weighted,
+        "start_date": start_date,
+    }
+
+
+@pytest.mark.parametrize("when, expected", [
+    (OCT_1 - timedelta(seconds=1), False),
+    (OCT_1, True),
+    (NOV_1 - timedelta(seconds=1), True),
+    (NOV_1, False),
+])
+def test_contains_includes_start_and_excludes_end(when, expected):
+    assert challenge(1).contains(when) is expected
+
+
+def test_open_ended_challenge_contains_everything_after_start():
+    assert challenge(1, end=None).contains(datetime(2030, 1, 1))
+
+
+def test_score_per_matching_challenge_with_its_weights():
+    # Types missing from a challenge's weights fall back to the defaults, so exclude Run explicitly
+    challenges = [challenge(1, Run=1), challenge(2, Run=2), challenge(3, Ride=1, Run=0)]
+
+    scores = score_for_challenges(activity(), challenges)
+
+    assert [(s["challenge_id"], s["weighted_distance"]) for s in scores] == [(1, 5.0), (2, 10.0)]
+    assert scores[0]["start_date"] == "2026-10-10T08:00:00"
+
+
+def test_no_score_outside_window_or_for_non_members():
+    challenges = [challenge(1, start=NOV_1, end=None), challenge(2, members=(8,))]
+
+    assert score_for_challenges(activity(), challenges) == []
+
+
+def test_aware_start_dates_are_compared_in_utc():
+    # 00:30 at UTC+2 is still September 30th in UTC
+    row = activity(start_date="2026-10-01T00:30:00+02:00")
+
+    assert score_for_challenges(row, [challenge(1)]) == []
+
+
+def test_attribute_keeps_globally_weighted_or_challenge_scored_activities():
+    rows = [
+        activity(1, type="Run", weighted=5.0),
+        activity(2, type="Walk", weighted=0.0),
+        activity(3, type="Hike", weighted=0.0),
+    ]
+
+    kept, scores = attribute_activities(rows, [challenge(1, Run=1, Walk=1)])
+
+    assert [row["activity_id"] for row in kept] == [1, 2]
+    assert [s["activity_id"] for s in scores] == [1, 2]
+
+
+def test_sync_window_is_the_union_of_challenge_windows():
+    challenges = [challenge(1, start=NOV_1, end=datetime(2026, 12, 1)), challenge(2)]
+
+    assert get_sync_window(challenges) == (OCT_1, datetime(2026, 12, 1))
+
+
+def test_sync_window_is_open_if_any_challenge_is():
+    assert get_sync_window([challenge(1), challenge(2, end=None)]) == (OCT_1, None)
+
+
+def test_sync_window_falls_back_to_configured_dates(settings_env):
+    settings_env(STRAVA_SYNC_START_DATE="2026-01-01", STRAVA_SYNC_END_DATE="2026-02-01")
+
+    assert get_sync_window([]) == (datetime(2026, 1, 1), datetime(2026, 2, 1))
+
+
+def test_pick_current_prefers_a_running_challenge():
+    now = datetime.now()
+    running = challenge(1, start=now - timedelta(days=30), end=now + timedelta(days=1))
+    ended_later = challenge(2, start=now - timedelta(days=1), end=now - timedelta(hours=1))
+
+    assert pick_current([running, ended_later]) is running
+
+
+def test_pick_current_falls_back_to_the_latest_start():
+    older = challenge(1, start=datetime(2025, 1, 1), end=datetime(2025, 2, 1))
+    newer = challenge(2, start=datetime(2025, 3, 1), end=datetime(2025, 4, 1))
+
+    assert pick_current([older, newer]) is newer
+    assert pick_current([]) is None
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+import db.idempotency
+from db.idempotency import WebhookEventStore
+
+KEY = (1, 42, "create", 1700000000)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+pytestmark = pytest.mark.supabase(db.idempotency)
+
+
+def test_first_delivery_is_claimed_and_stored(fake_db):
+    store = WebhookEventStore()
+
+    assert run(store.claim(KEY))
+
+    assert fake_db.upserts("webhook_events") == [{
+        "subscription_id": 1,
+        "object_id": 42,
+        "aspect_type": "create",
+        "event_time": 1700000000,
+    }]
+    assert fake_db.queries[0].kwargs["ignore_duplicates"] is True
+
+
+def test_retry_is_recognized_in_memory(fake_db):
+    store = WebhookEventStore()
+    run(store.claim(KEY))
+    queries_after_claim = len(fake_db.queries)
+
+    assert not run(store.claim(KEY))
+    # No DB round trip for an LRU hit
+    assert len(fake_db.queries) == queries_after_claim
+
+
+def test_key_stored_before_restart_is_a_duplicate(fake_db):
+    # ignore_duplicates returns no rows when the key already exists
+    fake_db.respond = lambda query: []
+
+    assert not run(WebhookEventStore().claim(KEY))
+
+
+def test_db_error_still_processes_the_event(fake_db):
+    fake_db.fail = 1
+
+    assert run(WebhookEventStore().claim(KEY))
+
+
+def test_release_allows_the_retry_to_be_processed(fake_db):
+    store = WebhookEventStore()
+    run(store.claim(KEY))
+
+    run(store.release(KEY))
+
+    delete = fake_db.queries[-1]
+    assert (delete.table, delete.op) == ("webhook_events", "delete")
+    assert ("eq", "object_id", 42) in delete.filters
+    assert run(store.claim(KEY))
+
+
+def test_lru_is_bounded(fake_db, settings_env):
+    settings_env(WEBHOOK_DEDUP_CACHE_SIZE=2)
+    store = WebhookEventStore()
+    for object_id in (1, 2, 3):
+        run(store.claim((1, object_id, "create", 0)))
+
+    # The oldest key was evicted and is looked up in the DB again
+    fake_db.respond = lambda query: []
+    queries_before = len(fake_db.queries)
+    assert not run(store.claim((1, 1, "create", 0)))
+    assert len(fake_db.queries) > queries_before
@@ -0,0 +1,54 @@
+import pytest
+
+from app.ocr import detect_sport, is_plausible_distance, ocr_activity_id, parse_distance
+
+
+@pytest.mark.parametrize("text, sport", [
+    ("Morning Run\nDistance 5.02 km\nElapsed Time 28:12", "Run"),
+    ("TREADMILL\n3.10 mi\nElapsed 25:00", "Run"),
+    ("Indoor Cycling\n20.5 km", "Ride"),
+    ("Pool Swim\n1500 m\nLaps 60", "Swim"),
+    ("Laps 40\n1000 m", "Swim"),
+    ("Elapsed Time 28:12\nDistance 5.02 km", None),
+    ("Runtime 10:00", None),
+])
+def test_detect_sport(text, sport):
+    assert detect_sport(text) == sport
+
+
+def test_explicit_sport_beats_generic_hint():
+    assert detect_sport("Laps 12\nRun 4.0 km") == "Run"
+
+
+@pytest.mark.parametrize("text, meters", [
+    ("Distance 5.02 km", 5020.0),
+    ("Distance 5,02 km", 5020.0),
+    ("1,234 m", 1234.0),
+    ("10,000 m", 10000.0),
+    ("3.1 mi", pytest.approx(4988.97, abs=0.01)),
+    # Splits are smaller than the total
+    ("Split 1 km\nSplit 2 km\nTotal 10.3 km", 10300.0),
+    # Pace and speed are not distances
+    ("5.2 km\nPace 5:30 /km\nSpeed 11.3 km/h", 5200.0),
+    ("Elapsed Time 28:12", None),
+])
+def test_parse_distance(text, meters):
+    assert parse_distance(text) == meters
+
+
+@pytest.mark.parametrize("sport, meters, plausible", [
+    ("Run", 5020.0, True),
+    ("Run", 502000.0, False),  # 5.02 km with a dropped decimal point
+    ("Run", 5.02, False),
+    ("Ride", 120000.0, True),
+    ("Swim", 1500.0, True),
+    ("Swim", 150000.0, False),
+])
+def test_is_plausible_distance(sport, meters, plausible):
+    assert is_plausible_distance(sport, meters) is plausible
+
+
+def test_ocr_activity_id_is_stable_and_negative():
+    assert ocr_activity_id("AQADx") == ocr_activity_id("AQADx")
+    assert ocr_activity_id("AQADx") < 0
+    assert ocr_activity_id("AQADx") != ocr_activity_id("AQADy")
@@ -0,0 +1,122 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import app.sync
+from core.scoring import DEFAULT_ACTIVITY_WEIGHTS
+from db.models import ActivityScore, Challenge, UserTokens
+
+USER = UserTokens(telegram_id=7, access_token="a", refresh_token="r", expires_at=0)
+
+
+def strava_activity(activity_id, distance=5000.0, name="Morning Run"):
+    return SimpleNamespace(
+        id=activity_id,
+        distance=distance,
+        type="Run",
+        name=name,
+        start_date=datetime(2026, 10, activity_id),
+    )
+
+
+def stored_row(activity_id, distance_km=5.0, name="Morning Run"):
+    return {
+        "activity_id": activity_id,
+        "type": "Run",
+        "distance": distance_km,
+        "weighted_distance": distance_km,
+        "name": name,
+        "start_date": datetime(2026, 10, activity_id).isoformat(),
+    }
+
+
+@pytest.fixture
+def sync_env(monkeypatch, settings_env):
+    settings_env(STRAVA_SYNC_START_DATE="2026-10-01")
+    written = []
+
+    async def no_challenges(telegram_id):
+        return []
+
+    async def weights():
+        return DEFAULT_ACTIVITY_WEIGHTS
+
+    async def no_refresh(telegram_id, weights, challenges):
+        pass
+
+    env = SimpleNamespace(fetched=[], stored={}, written=written)
+    monkeypatch.setattr(app.sync, "get_user_challenges", no_challenges)
+    monkeypatch.setattr(app.sync, "refresh_activity_weights", weights)
+    monkeypatch.setattr(app.sync, "refresh_all_weighted_distances", no_refresh)
+    monkeypatch.setattr(app.sync, "_fetch_activities", lambda user, after, before: env.fetched)
+    monkeypatch.setattr(app.sync, "get_stored_activities", lambda telegram_id, since: env.stored)
+    monkeypatch.setattr(app.sync, "get_challenge_scores", lambda telegram_id, since: {})
+    monkeypatch.setattr(app.sync.write_buffer, "upsert", lambda table, rows: written.append((table, rows)))
+    return env
+
+
+def test_unchanged_activities_are_not_written(sync_env):
+    sync_env.fetched = [strava_activity(1), strava_activity(2)]
+    sync_env.stored = {1: stored_row(1), 2: stored_row(2)}
+
+    asyncio.run(app.sync.sync_user_activities(USER))
+
+    assert sync_env.written == []
+
+
+def test_only_new_and_changed_activities_are_written(sync_env):
+    sync_env.fetched = [
+        strava_activity(1),
+        strava_activity(2, name="Evening Run"),
+        strava_activity(3, distance=10000.0),
+    ]
+    sync_env.stored = {1: stored_row(1), 2: stored_row(2)}
+
+    asyncio.run(app.sync.sync_user_activities(USER))
+
+    [(table, rows)] = sync_env.written
+    assert table == "activities"
+    assert [row["activity_id"] for row in rows] == [2, 3]
+
+
+def test_is_unchanged_normalizes_stored_values():
+    row = app.sync.activity_to_row(strava_activity(1), 7, DEFAULT_ACTIVITY_WEIGHTS)
+    stored = {**stored_row(1), "distance": "5.0", "start_date": "2026-10-01T00:00:00+00:00"}
+
+    assert app.sync.is_unchanged(row, stored)
+    assert not app.sync.is_unchanged(row, None)
+    assert not app.sync.is_unchanged(row, {**stored, "weighted_distance": 4.0})
+
+
+@pytest.mark.supabase(app.sync)
+def test_scores_written_after_the_snapshot_are_not_deleted(fake_db, monkeypatch):
+    # Runs no longer count for the challenge, so the score of activity 1 is stale
+    challenge = Challenge(
+        id=1, name="Ride only", chat_id=None, start_date=datetime(2026, 10, 1), end_date=None,
+        members=frozenset({7}), weights={"Ride": DEFAULT_ACTIVITY_WEIGHTS["Ride"], "Run": 0},
+    )
+    snapshot = [ActivityScore(1, "Run", 5.0, 5.0, datetime(2026, 10, 1))]
+    # Activity 2 and its score were flushed after the snapshot was read
+    stored = {(1, 1): 5.0, (1, 2): 0.5}
+    monkeypatch.setattr(app.sync, "get_challenge_scores", lambda telegram_id: stored)
+
+    asyncio.run(app.sync.refresh_challenge_scores(7, snapshot, [challenge]))
+
+    [delete] = [q for q in fake_db.queries if q.op == "delete"]
+    assert ("in", "activity_id", [1]) in delete.filters
+
+
+def test_scores_are_only_reweighted_after_weights_change(monkeypatch):
+    reads = []
+    monkeypatch.setattr(app.sync, "get_activity_scores", lambda telegram_id: reads.append(telegram_id) or [])
+    weights = dict(DEFAULT_ACTIVITY_WEIGHTS)
+
+    asyncio.run(app.sync.refresh_all_weighted_distances(8, weights, []))
+    asyncio.run(app.sync.refresh_all_weighted_distances(8, dict(weights), []))
+    assert reads == [8]
+
+    weights["Ride"] = DEFAULT_ACTIVITY_WEIGHTS["Run"]
+    asyncio.run(app.sync.refresh_all_weighted_distances(8, weights, []))
+    assert reads == [8, 8]
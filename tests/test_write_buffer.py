@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import pytest
+
+import db.write_buffer
+from db.versions import activity_data_version
+from db.write_buffer import WriteBuffer
+
+pytestmark = pytest.mark.supabase(db.write_buffer)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_rows_are_merged_by_primary_key(fake_db):
+    async def scenario():
+        buffer = WriteBuffer()
+        buffer.upsert("activities", {"activity_id": 1, "type": "Run", "weighted_distance": 5.0})
+        buffer.upsert("activities", {"activity_id": 1, "weighted_distance": 6.0})
+        buffer.upsert("activities", {"activity_id": 2, "type": "Ride", "weighted_distance": 2.0})
+        await buffer.flush()
+
+    run(scenario())
+
+    assert fake_db.upserts("activities") == [[
+        {"activity_id": 1, "type": "Run", "weighted_distance": 6.0},
+        {"activity_id": 2, "type": "Ride", "weighted_distance": 2.0},
+    ]]
+
+
+def test_composite_primary_key(fake_db):
+    async def scenario():
+        buffer = WriteBuffer()
+        buffer.upsert("challenge_activities", [
+            {"challenge_id": 1, "activity_id": 7, "weighted_distance": 1.0},
+            {"challenge_id": 2, "activity_id": 7, "weighted_distance": 2.0},
+            {"challenge_id": 1, "activity_id": 7, "weighted_distance": 3.0},
+        ])
+        await buffer.flush()
+
+    run(scenario())
+
+    assert fake_db.upserts("challenge_activities") == [[
+        {"challenge_id": 1, "activity_id": 7, "weighted_distance": 3.0},
+        {"challenge_id": 2, "activity_id": 7, "weighted_distance": 2.0},
+    ]]
+
+
+def test_rows_are_grouped_by_column_set(fake_db):
+    async def scenario():
+        buffer = WriteBuffer()
+        buffer.upsert("users", {"telegram_id": 1, "telegram_username": "a"})
+        buffer.upsert("users", {"telegram_id": 2, "first_name": "B", "last_name": "C"})
+        buffer.upsert("users", {"telegram_id": 3, "telegram_username": "d"})
+        await buffer.flush()
+
+    run(scenario())
+
+    assert fake_db.upserts("users") == [
+        [{"telegram_id": 1, "telegram_username": "a"}, {"telegram_id": 3, "telegram_username": "d"}],
+        [{"telegram_id": 2, "first_name": "B", "last_name": "C"}],
+    ]
+
+
+def test_failed_rows_are_kept_and_retried(fake_db):
+    async def scenario():
+        buffer = WriteBuffer(window=0.01)
+        buffer.upsert("activities", {"activity_id": 1, "weighted_distance": 5.0})
+        fake_db.fail = 1
+        await buffer.flush()
+        assert buffer.pending_count() == 1
+
+        # Rows queued after the failure win over the requeued ones
+        buffer.upsert("activities", {"activity_id": 1, "weighted_distance": 6.0})
+        await buffer.flush()
+        assert buffer.pending_count() == 0
+        await buffer.close()
+
+    run(scenario())
+
+    assert fake_db.upserts("activities") == [[{"activity_id": 1, "weighted_distance": 6.0}]]
+
+
+def test_activity_writes_bump_the_data_version(fake_db):
+    async def scenario():
+        buffer = WriteBuffer()
+        buffer.upsert("users", {"telegram_id": 1, "telegram_username": "a"})
+        await buffer.flush()
+        after_users = activity_data_version()
+        buffer.upsert("activities", {"activity_id": 1, "weighted_distance": 5.0})
+        await buffer.flush()
+        return after_users
+
+    before = activity_data_version()
+    after_users = run(scenario())
+
+    assert after_users == before
+    assert activity_data_version() == before + 1
+
+
+def test_close_during_a_flush_keeps_the_batch(fake_db):
+    attempts = []
+
+    def slow_and_failing_once(query):
+        attempts.append(query.payload)
+        time.sleep(0.05)
+        if len(attempts) == 1:
+            raise RuntimeError("database unavailable")
+        return query.payload
+
+    fake_db.respond = slow_and_failing_once
+
+    async def scenario():
+        buffer = WriteBuffer(window=0.01)
+        buffer.upsert("activities", {"activity_id": 1, "weighted_distance": 5.0})
+        # The timer has taken the batch out of the buffer and is writing it
+        await asyncio.sleep(0.03)
+        await buffer.close()
+        return buffer.pending_count()
+
+    assert run(scenario()) == 0
+    assert attempts == [[{"activity_id": 1, "weighted_distance": 5.0}]] * 2